@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import hashlib
+import pickle
+from typing import TYPE_CHECKING, Any, Callable
+
+if TYPE_CHECKING:
+    from diskcache import Cache
+    from pydantic_ai import Agent, RunUsage, UsageLimits
+    from pydantic_ai.messages import ModelMessage
+
+_CACHE_DIR = ".agent_cache"
+
+# Bump when the stored value shape or keying scheme changes, so stale
+# entries from older layouts are never replayed.
+_CACHE_VERSION = 2
+
+_cache: Cache | None = None
+
+
+def _get_cache() -> Cache:
+    global _cache
+    if _cache is None:
+        from diskcache import Cache
+
+        _cache = Cache(_CACHE_DIR)
+    return _cache
+
+
+def _cache_key(model_id: str, system_prompt: str, prompt: str) -> str:
+    raw = pickle.dumps((_CACHE_VERSION, model_id, system_prompt, prompt))
+    return hashlib.blake2b(raw).hexdigest()
+
+
+async def cached_run(
+    agent: Agent[None, Any],
+    prompt: str,
+    *,
+    message_history: list[ModelMessage] | None = None,
+    usage: RunUsage | None = None,
+    usage_limits: UsageLimits | None = None,
+    use_cache: bool = True,
+    system_prompt: str = "",
+    on_partial: Callable[[str], None] | None = None,
+    on_cache_hit: Callable[[], None] | None = None,
+) -> tuple[Any, list[ModelMessage]]:
+    """Run the agent with streaming, serving repeated prompts from disk.
+
+    Returns ``(output, messages)``. The run is streamed so callers see
+    progress before the full response arrives: ``on_partial`` is invoked
+    once with the first parsed fragment of the structured output, and
+    ``on_cache_hit`` when a stored result is replayed instead of running.
+
+    Entries are keyed on the system prompt as well as the user prompt,
+    so editing the agent's instructions invalidates old answers.
+    Continuation prompts embed nondeterministic tool output in their
+    message history, so only history-free (first-iteration) calls are
+    cached; everything else falls through to a normal run.
+    """
+    model_id = getattr(agent.model, "model_name", str(agent.model))
+    cacheable = use_cache and not message_history
+
+    if cacheable:
+        key = _cache_key(model_id, system_prompt, prompt)
+        hit = _get_cache().get(key)
+        if hit is not None:
+            if on_cache_hit is not None:
+                on_cache_hit()
+            return hit  # type: ignore[no-any-return]
+
+    shown = False
+    async with agent.run_stream(
+        prompt,
+        message_history=message_history,
+        usage=usage,
+        usage_limits=usage_limits,
+    ) as stream:
+        async for partial in stream.stream_output(debounce_by=0.1):
+            if on_partial is not None and not shown:
+                preview = getattr(partial, "next_step", None) or getattr(
+                    partial, "result", None
+                )
+                if preview:
+                    on_partial(preview)
+                    shown = True
+        output = await stream.get_output()
+        messages = stream.all_messages()
+
+    if cacheable:
+        _get_cache().set(key, (output, messages))
+
+    return output, messages
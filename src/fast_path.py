@@ -0,0 +1,73 @@
+import re
+
+# Words that signal the query wants more than one canned fact (log
+# fetching, state changes, multi-step work), so it must reach the agent.
+_DISQUALIFIERS = re.compile(
+    r"(?i)\b(?:logs?|delete|remove|stop|start|restart|kill|find|and|then)\b"
+)
+
+# (pattern, command template) pairs, first match wins. Templates are
+# filled with the pattern's capture groups. Patterns are anchored to the
+# whole query so partial overlaps with richer requests fall through to
+# the agent. Only read-only commands belong here: matches run without
+# confirmation and without the LLM.
+_FAST_PATHS: list[tuple[re.Pattern[str], str]] = [
+    (
+        re.compile(
+            r"(?i)^\s*(?:list|show)(?:\s+(?:me|all|the|my))*"
+            r"\s+(?:running\s+)?docker\s+containers?\s*$"
+        ),
+        "docker ps",
+    ),
+    (
+        re.compile(
+            r"(?i)^\s*(?:list|show|get)(?:\s+(?:me|all|the|my))*"
+            r"\s+(?:k8s\s+|kubernetes\s+)?pods\s*$"
+        ),
+        "kubectl get pods",
+    ),
+    (
+        re.compile(
+            r"(?i)^\s*(?:what(?:'s|\s+is)\s+(?:running\s+|listening\s+)?"
+            r"on\s+)?port\s+(\d+)\s*\??\s*$"
+        ),
+        "lsof -i :{0}",
+    ),
+    (
+        re.compile(
+            r"(?i)^\s*(?:check\s+|show\s+(?:me\s+)?)?disk\s+(?:usage|space)\s*$"
+        ),
+        "df -h",
+    ),
+    (
+        re.compile(
+            r"(?i)^\s*(?:check\s+|show\s+(?:me\s+)?)?(?:memory|ram)\s+usage\s*$"
+        ),
+        "free -h",
+    ),
+    (
+        re.compile(
+            r"(?i)^\s*(?:list|show)(?:\s+(?:me|all|the|my))*"
+            r"\s+(?:running\s+)?processes\s*$"
+        ),
+        "ps aux",
+    ),
+]
+
+
+def match_fast_path(query: str) -> str | None:
+    """Return a canned read-only command for a trivial query, or None.
+
+    Lets async_main answer the hottest simple queries with a single
+    local shell command instead of spinning up the full agent workflow.
+    Only whole-query matches on genuinely one-fact questions qualify;
+    anything mentioning logs, state changes, or multi-step work falls
+    through to the agent.
+    """
+    if _DISQUALIFIERS.search(query):
+        return None
+    for pattern, template in _FAST_PATHS:
+        match = pattern.match(query)
+        if match:
+            return template.format(*match.groups())
+    return None
@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+from src.settings import Settings, settings
+
+if TYPE_CHECKING:
+    import boto3
+    from pydantic_ai.models.bedrock import BedrockConverseModel
+    from pydantic_ai.models.google import GoogleModel
+
+_boto3_session: boto3.Session | None = None
+
+
+def _get_boto3_session(settings: Settings) -> boto3.Session:
+    """One boto3 session per process: the credential chain and config
+    files are resolved once and every Bedrock client shares the result"""
+    global _boto3_session
+    if _boto3_session is None:
+        import boto3
+
+        _boto3_session = boto3.Session(
+            profile_name=settings.aws_profile_name,
+            region_name=settings.aws_region_name,
+        )
+    return _boto3_session
+
+
+class GoogleService:
+    """Builds the Gemini model, caching the provider/model pair"""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._model: GoogleModel | None = None
+
+    def get_model(self) -> GoogleModel:
+        """Return the Gemini model, building it on first call only"""
+        if self._model is None:
+            # Deferred so the Bedrock path (and a bare --help run) never
+            # pays for the Google client imports.
+            import httpx
+            from google import genai
+            from google.genai.types import HttpOptions
+            from pydantic_ai.models.google import GoogleModel
+            from pydantic_ai.providers.google import GoogleProvider
+
+            # GoogleProvider has no http_client kwarg; pooling is
+            # configured on the genai client's own httpx client so every
+            # model call reuses keep-alive connections instead of paying
+            # a fresh TCP+TLS handshake. The client owns the pool, so no
+            # separate shutdown hook is needed.
+            http_args: dict[str, object] = {
+                "limits": httpx.Limits(
+                    max_keepalive_connections=20,
+                    max_connections=100,
+                    keepalive_expiry=30.0,
+                ),
+                "timeout": httpx.Timeout(60.0),
+            }
+            client = genai.Client(
+                api_key=self.settings.gemini_api_key,
+                http_options=HttpOptions(
+                    client_args=http_args, async_client_args=http_args
+                ),
+            )
+            provider = GoogleProvider(client=client)
+            self._model = GoogleModel(
+                self.settings.gemini_model_name, provider=provider
+            )
+        return self._model
+
+
+class BedrockService:
+    """Builds the Bedrock Converse model, caching the session and model"""
+
+    def __init__(self, settings: Settings) -> None:
+        self.settings = settings
+        self._model: BedrockConverseModel | None = None
+
+    def get_model(self) -> BedrockConverseModel:
+        """Return the Bedrock model, building it on first call only"""
+        if self._model is None:
+            # Deferred so the Google path never pays for boto3 imports.
+            from botocore.config import Config
+            from pydantic_ai.models.bedrock import (
+                BedrockConverseModel,
+                BedrockModelSettings,
+            )
+            from pydantic_ai.providers.bedrock import BedrockProvider
+
+            session = _get_boto3_session(self.settings)
+            provider = BedrockProvider(
+                bedrock_client=session.client(
+                    "bedrock-runtime",
+                    config=Config(
+                        max_pool_connections=50,
+                        tcp_keepalive=True,
+                        retries={"mode": "adaptive"},
+                    ),
+                )
+            )
+            model_settings = None
+            if self.settings.bedrock_latency_optimized:
+                # Routes supported Claude/Llama models to AWS's
+                # latency-optimized inference path.
+                model_settings = BedrockModelSettings(
+                    bedrock_performance_configuration={"latency": "optimized"}
+                )
+            self._model = BedrockConverseModel(
+                self.settings.bedrock_model_name,
+                provider=provider,
+                settings=model_settings,
+            )
+        return self._model
+
+
+@lru_cache(maxsize=None)
+def _build_service(provider: str) -> GoogleService | BedrockService:
+    if provider == "bedrock":
+        return BedrockService(settings)
+    return GoogleService(settings)
+
+
+def get_llm_service() -> GoogleService | BedrockService:
+    """Return the cached service for the configured provider"""
+    return _build_service(settings.llm_provider)
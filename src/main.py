@@ -1,31 +1,69 @@
+from __future__ import annotations
+
 import asyncio
 import sys
+import time
 from dataclasses import dataclass
-from typing import Annotated, Any
+from typing import TYPE_CHECKING, Annotated, Any, Literal
 
-from plumbum import ProcessExecutionError, local
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent, RunContext, RunUsage, UsageLimits
-from pydantic_ai.common_tools.duckduckgo import duckduckgo_search_tool
-from pydantic_ai.messages import ModelMessage
-from pydantic_ai.models.google import GoogleModel
-from pydantic_ai.providers.google import GoogleProvider
-from rich import print
 
-from src.settings import settings
+if sys.stdout.isatty():
+    from rich import print
+else:
+    # Piped output: skip importing rich entirely — it is a heavy import
+    # and every call would pay markup/style rendering for ANSI codes
+    # nobody sees. Strip the markup tags and use the builtin print.
+    import builtins
+    import re as _re
+
+    # Match only the style tags this module's format strings use, so
+    # interpolated command output (e.g. ps aux's "[kworker/0:0]" or git's
+    # "[main abc123]") passes through piped output verbatim.
+    _STYLES = r"(?:bold|dim|blue|cyan|green|magenta|red|white|yellow)"
+    _MARKUP_RE = _re.compile(rf"\[/?{_STYLES}(?: {_STYLES})*\]")
+
+    def print(*objects: Any, **kwargs: Any) -> None:  # noqa: A001
+        builtins.print(
+            *(
+                _MARKUP_RE.sub("", obj) if isinstance(obj, str) else obj
+                for obj in objects
+            ),
+            **kwargs,
+        )
+
+
+if TYPE_CHECKING:
+    from pydantic_ai import Agent
+    from pydantic_ai.messages import ModelMessage
 
 
-class ShellResult(BaseModel):
-    """Result from executing a shell command"""
+@dataclass(slots=True, frozen=True)
+class ShellResult:
+    """Result from executing a shell command.
+
+    A plain slotted dataclass rather than a Pydantic model: results only
+    flow back to the agent as serialized dicts, so per-field validation
+    on this hot path buys nothing. The task outputs below stay Pydantic
+    models since they come through the LLM's structured-output parsing.
+    """
 
     command: str
     output: str
     success: bool
 
+    def model_dump(self) -> dict[str, Any]:
+        return {
+            "command": self.command,
+            "output": self.output,
+            "success": self.success,
+        }
+
 
 class TaskComplete(BaseModel):
     """Indicates the task has been completed successfully"""
 
+    kind: Literal["complete"] = "complete"
     result: str
     summary: str
 
@@ -33,6 +71,7 @@ class TaskComplete(BaseModel):
 class TaskContinue(BaseModel):
     """Indicates more exploration is needed"""
 
+    kind: Literal["continue"] = "continue"
     next_step: str
     reason: str
 
@@ -40,27 +79,73 @@ class TaskContinue(BaseModel):
 class TaskFailed(BaseModel):
     """Indicates the task failed"""
 
+    kind: Literal["failed"] = "failed"
     error: str
     attempted_steps: list[str]
 
 
-@dataclass
-class ShellContext:
-    """Context for tracking shell operations"""
-
-    query: str
-    steps_taken: list[str]
-    discoveries: dict[str, str]
-    max_iterations: int = 10
-
-
-async def create_shell_agent(
-    model: Any,
-) -> Agent[None, TaskComplete | TaskContinue | TaskFailed]:
-    """Create a single agent for handling complex shell queries"""
-    search_tool = duckduckgo_search_tool()
+async def _execute_shell_command(command: str, timeout: int) -> ShellResult:
+    """Run a shell command without blocking the event loop and wrap it
+    in a ShellResult, echoing its output"""
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            "bash",
+            "-c",
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            stdout_bytes, stderr_bytes = await asyncio.wait_for(
+                proc.communicate(), timeout=timeout
+            )
+        except TimeoutError:
+            proc.kill()
+            await proc.wait()
+            print(f"[red]⏰ Command timed out after {timeout} seconds[/red]")
+            return ShellResult(
+                command=command,
+                output=f"Command timed out after {timeout} seconds",
+                success=False,
+            )
 
-    system_prompt = """
+        stdout = stdout_bytes.decode(errors="replace")
+        stderr = stderr_bytes.decode(errors="replace")
+        retcode = proc.returncode or 0
+
+        # Display output to user immediately
+        if stdout.strip():
+            print(f"[green]📄 Output:[/green]\n{stdout}")
+        if stderr.strip():
+            print(f"[yellow]⚠️  Stderr:[/yellow]\n{stderr}")
+        if retcode != 0:
+            print(f"[red]❌ Exit code: {retcode}[/red]")
+
+        # Determine success based on return code
+        success = retcode == 0
+        output = (
+            f"Exit code: {retcode}\nStdout:\n{_truncate_output(stdout)}\n"
+            f"Stderr:\n{_truncate_output(stderr)}"
+        )
+
+        return ShellResult(command=command, output=output, success=success)
+
+    except Exception as e:
+        return ShellResult(
+            command=command,
+            output=f"Unexpected error: {e}",
+            success=False,
+        )
+
+
+# Materialized once so Pydantic's union schema is only built at import.
+# The kind tag makes this a discriminated union: validation dispatches on
+# one field lookup instead of trying each variant in turn.
+OUTPUT_UNION = Annotated[
+    TaskComplete | TaskContinue | TaskFailed, Field(discriminator="kind")
+]
+
+SYSTEM_PROMPT = """
     You are an intelligent shell assistant that can handle complex,
     multi-stage queries.
 
@@ -72,9 +157,13 @@ async def create_shell_agent(
        commands
 
     For ambiguous queries like "show container logs":
-    - First run 'docker ps' to see running containers
-    - Then run 'kubectl get pods' to check k8s pods
-    - Finally get logs from the most relevant container/pod
+    - Run 'docker ps' and 'kubectl get pods' together via
+      run_shell_commands to check both in one step
+    - Then get logs from the most relevant container/pod
+
+    When several read-only discovery commands are independent of each
+    other, batch them into a single run_shell_commands call instead of
+    one command per step.
 
     For queries about "something" or partial names:
     - Use grep, find, or ps to search for matches
@@ -82,22 +171,207 @@ async def create_shell_agent(
     - Present findings clearly
 
     IMPORTANT:
+    - Before running any command that modifies state, call
+      propose_command and proceed with run_shell_command only if it is
+      approved. Read-only commands need no approval.
     - return TaskComplete ONLY when you've successfully answered the
       user's query
     - Return TaskContinue if you need to explore more
     - Return TaskFailed only if you've exhausted reasonable options
     """
 
+# How many trailing messages survive history pruning between iterations
+_KEEP_RECENT_MESSAGES = 6
+
+# Caps on command output fed back to the model; the full output is still
+# echoed to the terminal
+_MAX_OUTPUT_CHARS = 4000
+_MAX_OUTPUT_LINES = 200
+
+
+def _truncate_output(text: str) -> str:
+    """Trim verbose command output before it enters the message history.
+
+    Tool output is re-sent to the model on every later iteration, so a
+    single chatty command (journalctl, find /) would otherwise blow the
+    context window. Keep the head and tail — where grep/ls/ps signal
+    usually lives — and mark what was dropped.
+    """
+    lines = text.splitlines()
+    if len(lines) > _MAX_OUTPUT_LINES:
+        keep = _MAX_OUTPUT_LINES // 2
+        omitted = len(lines) - 2 * keep
+        text = "\n".join(
+            lines[:keep] + [f"... [{omitted} lines omitted] ..."] + lines[-keep:]
+        )
+    if len(text) > _MAX_OUTPUT_CHARS:
+        keep = _MAX_OUTPUT_CHARS // 2
+        omitted = len(text) - 2 * keep
+        text = (
+            text[:keep]
+            + f"\n... [{omitted} chars truncated] ...\n"
+            + text[-keep:]
+        )
+    return text
+
+
+# Shared search client plus a small TTL cache so repeated queries across
+# iterations reuse the client's pooled connections and skip the network
+_SEARCH_TTL_SECONDS = 600.0
+_search_client: Any = None
+_search_cache: dict[str, tuple[float, list[dict[str, str]]]] = {}
+
+
+def _search_duckduckgo(query: str, max_results: int = 5) -> list[dict[str, str]]:
+    """Search DuckDuckGo, caching results for a few minutes"""
+    global _search_client
+    key = query.strip().lower()
+    now = time.monotonic()
+    hit = _search_cache.get(key)
+    if hit is not None and now - hit[0] < _SEARCH_TTL_SECONDS:
+        return hit[1]
+
+    if _search_client is None:
+        from ddgs import DDGS
+
+        _search_client = DDGS()
+
+    results = _search_client.text(query, max_results=max_results)
+    _search_cache[key] = (now, results)
+    return results
+
+
+def _prune_message_history(
+    messages: list[ModelMessage], keep_recent: int = _KEEP_RECENT_MESSAGES
+) -> list[ModelMessage]:
+    """Compact the conversation before the next iteration re-sends it.
+
+    History grows every iteration, so later requests re-pay prefill cost
+    for every earlier tool result. Keep the first request untouched (the
+    system prompt plus original query form a stable prefix that
+    provider-side prompt caches can reuse), keep the most recent messages,
+    and collapse everything in between into one synthetic assistant
+    message built from a local template — no extra LLM call.
+    """
+    if len(messages) <= keep_recent + 2:
+        return messages
+
+    from pydantic_ai.messages import (
+        ModelRequest,
+        ModelResponse,
+        TextPart,
+        ToolCallPart,
+        UserPromptPart,
+    )
+
+    def _is_user_request(message: ModelMessage) -> bool:
+        return isinstance(message, ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in message.parts
+        )
+
+    # Cut only at a request that carries a user prompt (an iteration
+    # boundary). Cutting at a bare tool-return request would leave the
+    # tail starting with a ToolReturnPart whose matching ToolCallPart was
+    # summarized away, which providers reject.
+    cut = len(messages) - keep_recent
+    while cut > 1 and not _is_user_request(messages[cut]):
+        cut -= 1
+    if cut <= 1:
+        return messages
+
+    dropped = messages[1:cut]
+    tools_used = []
+    for message in dropped:
+        for part in message.parts:
+            if isinstance(part, ToolCallPart) and part.tool_name not in tools_used:
+                tools_used.append(part.tool_name)
+
+    summary = f"Earlier exploration compacted: {len(dropped)} messages omitted"
+    if tools_used:
+        summary += f"; tools called: {', '.join(tools_used)}"
+    summary += ". Recent results follow."
+
+    return [
+        messages[0],
+        ModelResponse(parts=[TextPart(content=summary)]),
+        *messages[cut:],
+    ]
+
+
+@dataclass
+class ShellContext:
+    """Context for tracking shell operations"""
+
+    query: str
+    steps_taken: list[str]
+    discoveries: dict[str, str]
+    max_iterations: int = 10
+
+
+# Agent construction generates JSON schemas for every tool and output
+# model; cache per model instance so repeated workflows skip it
+_agent_cache: dict[int, Any] = {}
+
+
+async def create_shell_agent(
+    model: Any,
+) -> Agent[None, TaskComplete | TaskContinue | TaskFailed]:
+    """Create a single agent for handling complex shell queries"""
+    cached = _agent_cache.get(id(model))
+    if cached is not None:
+        return cached  # type: ignore[no-any-return]
+
+    # Deferred: pydantic_ai is the dominant cost of a cold start, and the
+    # usage/--help path should not pay for it.
+    from pydantic_ai import Agent
+
     agent = Agent(  # type: ignore[call-overload]
         model,
-        tools=[search_tool],
-        system_prompt=system_prompt,
-        output_type=TaskComplete | TaskContinue | TaskFailed,
+        system_prompt=SYSTEM_PROMPT,
+        output_type=OUTPUT_UNION,
     )
 
-    @agent.tool
-    def run_shell_command(
-        ctx: RunContext[None],
+    approved_commands: set[str] = set()
+
+    @agent.tool_plain
+    async def propose_command(
+        command: Annotated[
+            str,
+            Field(description="The state-modifying shell command to run."),
+        ],
+        reason: Annotated[
+            str, Field(description="Why this command is needed.")
+        ],
+    ) -> Literal["approved", "denied"]:
+        """
+        Ask the user to approve a state-modifying command.
+
+        Must be called before run_shell_command for any command that is
+        not read-only; a denied proposal costs no shell execution.
+        Approvals are single-use: running the same command again needs a
+        fresh proposal.
+        """
+        print(f"\n[bold yellow]❓ Proposed:[/bold yellow] [yellow]`{command}`[/yellow]")
+        print(f"  [yellow]Reason:[/yellow] {reason}")
+        confirm = await asyncio.to_thread(
+            input, "  Approve this command? (y/n): "
+        )
+        if confirm.lower() == "y":
+            approved_commands.add(command)
+            return "approved"
+        return "denied"
+
+    @agent.tool_plain
+    async def duckduckgo_search(
+        query: Annotated[
+            str, Field(description="Search query for DuckDuckGo.")
+        ],
+    ) -> list[dict[str, str]]:
+        """Search DuckDuckGo and return the top results"""
+        return await asyncio.to_thread(_search_duckduckgo, query)
+
+    @agent.tool_plain
+    async def run_shell_command(
         command: Annotated[
             str,
             Field(
@@ -137,69 +411,95 @@ async def create_shell_agent(
         """
         print(f"\n[bold blue]▶️  Executing:[/bold blue] [yellow]`{command}`[/yellow] with timeout {timeout} seconds")
 
-        try:
-            execute = False
-            if read_only:
-                execute = True
-            else:
-                confirm = input("  Execute modifying command? (y/n): ").lower()
-                execute = confirm == "y"
-
-            if execute:
-                bash = local["bash"]
-                retcode, stdout, stderr = bash["-c", command].run(
-                    retcode=None, timeout=timeout)
-
-                # Display output to user immediately
-                if stdout.strip():
-                    print(f"[green]📄 Output:[/green]\n{stdout}")
-                if stderr.strip():
-                    print(f"[yellow]⚠️  Stderr:[/yellow]\n{stderr}")
-                if retcode != 0:
-                    print(f"[red]❌ Exit code: {retcode}[/red]")
-
-                # Determine success based on return code
-                success = retcode == 0
-                output = f"Exit code: {retcode}\nStdout:\n{stdout}\n"
-                f"Stderr:\n{stderr}"
-
-                return ShellResult(command=command, output=output, success=success)
-            else:
-                return ShellResult(
-                    command=command,
-                    output="Command execution cancelled by user.",
-                    success=False,
-                )
+        if read_only:
+            return await _execute_shell_command(command, timeout)
+        if command in approved_commands:
+            # Single-use: re-running the command needs a fresh proposal.
+            approved_commands.discard(command)
+            return await _execute_shell_command(command, timeout)
+        return ShellResult(
+            command=command,
+            output="Modifying command was not approved. Call "
+            "propose_command first and run it only if approved.",
+            success=False,
+        )
+
+    @agent.tool_plain
+    async def run_shell_commands(
+        commands: Annotated[
+            list[str],
+            Field(
+                description="Independent read-only discovery commands to "
+                "run concurrently, e.g. ['docker ps', 'kubectl get pods']."
+            ),
+        ],
+        read_only: Annotated[
+            bool,
+            Field(
+                description="True only if every command in the batch is "
+                "read-only; modifying commands must be approved via "
+                "propose_command first."
+            ),
+        ],
+        timeout: Annotated[
+            int,
+            Field(
+                default=30,
+                description="Timeout in seconds applied to each command.",
+                ge=1,
+                le=300,
+            ),
+        ] = 30,
+    ) -> list[ShellResult]:
+        """
+        Execute several independent read-only shell commands concurrently.
 
-        except ProcessExecutionError as e:
-            # Display error output to user immediately
-            if e.stdout.strip():
-                print(f"[green]📄 Output:[/green]\n{e.stdout}")
-            if e.stderr.strip():
-                print(f"[yellow]⚠️  Stderr:[/yellow]\n{e.stderr}")
-            print(f"[red]❌ Exit code: {e.retcode}[/red]")
-
-            output = (
-                f"Command failed with exit code {e.retcode}\n"
-                f"Stdout:\n{e.stdout}\nStderr:\n{e.stderr}"
-            )
-            return ShellResult(command=command, output=output, success=False)
-        except Exception as e:
+        Use to batch discovery commands that don't depend on each other
+        (e.g. 'docker ps' and 'kubectl get pods') into a single turn
+        instead of one command per turn. Commands that modify state must
+        go through run_shell_command instead.
+        """
+        print(f"\n[bold blue]▶️  Executing {len(commands)} commands concurrently:[/bold blue]")
+        for command in commands:
+            print(f"  [yellow]`{command}`[/yellow]")
+
+        async def _run_gated(command: str) -> ShellResult:
+            # Same gate as run_shell_command: a modifying command only
+            # runs if the user approved it via propose_command, and each
+            # approval is consumed by a single execution.
+            if read_only:
+                return await _execute_shell_command(command, timeout)
+            if command in approved_commands:
+                approved_commands.discard(command)
+                return await _execute_shell_command(command, timeout)
             return ShellResult(
                 command=command,
-                output=f"Unexpected error: {e}",
+                output="Modifying command was not approved. Call "
+                "propose_command first and run it only if approved.",
                 success=False,
             )
 
+        results = await asyncio.gather(
+            *(_run_gated(command) for command in commands)
+        )
+        return list(results)
+
+    _agent_cache[id(model)] = agent
     return agent  # type: ignore[no-any-return]
 
 
-async def run_shell_workflow(query: str, model: Any) -> None:
+async def run_shell_workflow(
+    query: str, model: Any, use_cache: bool = True
+) -> None:
     """Main workflow for handling shell queries with conversation continuity"""
     print(f"[bold cyan]🔍 Starting shell workflow for:[/bold cyan] [white]{query}[/white]")
 
     context = ShellContext(query=query, steps_taken=[], discoveries={})
 
+    from pydantic_ai import RunUsage, UsageLimits
+
+    from src.cache import cached_run
+
     # Create the agent
     agent = await create_shell_agent(model)
 
@@ -207,29 +507,46 @@ async def run_shell_workflow(query: str, model: Any) -> None:
     message_history: list[ModelMessage] | None = None
     usage = RunUsage()
     usage_limits = UsageLimits(request_limit=20)
+    continue_prompt = "Continue with the next step based on previous results."
 
     iteration = 0
+    next_run: asyncio.Task[Any] | None = None
 
     while iteration < context.max_iterations:
         iteration += 1
         print(f"\n[bold magenta]📋 Iteration {iteration}[/bold magenta]")
 
         try:
-            # Construct the prompt for this iteration
-            if iteration == 1:
-                prompt = f"Handle this query: {query}"
+            if next_run is not None:
+                # The continuation call was started at the end of the
+                # previous iteration; just collect it.
+                output, messages = await next_run
+                next_run = None
             else:
-                prompt = "Continue with the next step based on previous results."
-
-            # Run the agent
-            result = await agent.run(
-                prompt,
-                message_history=message_history,
-                usage=usage,
-                usage_limits=usage_limits,
-            )
+                # Construct the prompt for this iteration
+                if iteration == 1:
+                    prompt = f"Handle this query: {query}"
+                else:
+                    prompt = continue_prompt
+
+                # Run the agent, echoing the first parsed fragment of the
+                # streamed output so progress shows before the response
+                # completes
+                output, messages = await cached_run(
+                    agent,
+                    prompt,
+                    message_history=message_history,
+                    usage=usage,
+                    usage_limits=usage_limits,
+                    use_cache=use_cache,
+                    system_prompt=SYSTEM_PROMPT,
+                    on_partial=lambda preview: print(f"[dim]… {preview}[/dim]"),
+                    on_cache_hit=lambda: print(
+                        "[dim]💾 Served from response cache "
+                        "(run with --no-cache for a fresh answer)[/dim]"
+                    ),
+                )
 
-            output = result.output
             context.steps_taken.append(f"Iteration {iteration}")
 
             if isinstance(output, TaskComplete):
@@ -241,23 +558,46 @@ async def run_shell_workflow(query: str, model: Any) -> None:
                 return
 
             elif isinstance(output, TaskContinue):
+                # Update message history to maintain conversation context,
+                # pruning old middle turns so prefill cost stays bounded
+                message_history = _prune_message_history(messages)
+                # Kick off the next model call now so its network
+                # round-trip overlaps with the rendering below.
+                next_run = asyncio.create_task(
+                    cached_run(
+                        agent,
+                        continue_prompt,
+                        message_history=message_history,
+                        usage=usage,
+                        usage_limits=usage_limits,
+                        use_cache=use_cache,
+                    )
+                )
                 print(f"[yellow]🔄 Continuing:[/yellow] {output.next_step}")
                 print(f"[yellow]Reason:[/yellow] {output.reason}")
-                # Update message history to maintain conversation context
-                message_history = result.all_messages()
 
             elif isinstance(output, TaskFailed):
+                # Stale negative search results shouldn't haunt a retry
+                _search_cache.clear()
                 print(f"\n[bold red]❌ Task failed:[/bold red] {output.error}")
                 print(f"[red]Attempted steps:[/red] {', '.join(output.attempted_steps)}")
                 return
 
         except Exception as e:
+            if next_run is not None:
+                # Don't orphan a speculative run: it would keep issuing
+                # model calls and tools alongside the retry below.
+                next_run.cancel()
+                next_run = None
             print(f"\n[bold red]💥 Error in iteration {iteration}:[/bold red] {e}")
             if iteration >= 3:  # Give up after 3 errors
                 print("[red]Too many errors, giving up.[/red]")
                 return
             continue
 
+    if next_run is not None:
+        next_run.cancel()
+
     print(f"\n[yellow]⏰ Reached maximum iterations ({context.max_iterations})[/yellow]")
     print(f"[blue]Steps taken:[/blue] {', '.join(context.steps_taken)}")
 
@@ -272,14 +612,25 @@ async def async_main() -> None:
         print("  python -m src.main3 'check disk usage and find large files'")
         return
 
-    query = " ".join(sys.argv[1:])
+    args = sys.argv[1:]
+    use_cache = "--no-cache" not in args
+    query = " ".join(a for a in args if a != "--no-cache")
+
+    from src.fast_path import match_fast_path
+
+    command = match_fast_path(query)
+    if command is not None:
+        print(f"[bold cyan]⚡ Fast path:[/bold cyan] [yellow]`{command}`[/yellow]\n")
+        await _execute_shell_command(command, timeout=30)
+        return
+
+    from src.llm_services import get_llm_service
 
-    provider = GoogleProvider(api_key=settings.gemini_api_key)
-    model = GoogleModel(settings.gemini_model_name, provider=provider)
+    model = get_llm_service().get_model()
 
     print(f"[bold cyan]🎯 Goal:[/bold cyan] [white]{query}[/white]\n")
 
-    await run_shell_workflow(query, model)
+    await run_shell_workflow(query, model, use_cache=use_cache)
 
 
 def main() -> None:
@@ -1,3 +1,5 @@
+from functools import lru_cache
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -5,8 +7,19 @@ class Settings(BaseSettings):
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8"
     )
+    llm_provider: str = "google"
     gemini_api_key: str = ""
     gemini_model_name: str = "gemini-1.5-flash"
+    bedrock_model_name: str = "anthropic.claude-3-5-sonnet-20240620-v1:0"
+    bedrock_latency_optimized: bool = True
+    aws_region_name: str = "us-east-1"
+    aws_profile_name: str | None = None
+
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Return the shared Settings instance, reading .env only once"""
+    return Settings()
 
 
-settings = Settings()
+settings = get_settings()